@@ -0,0 +1,17 @@
+"""
+Shared dependency providers for API endpoints
+"""
+from fastapi import Request
+
+from app.services.recognition_engine import RecognitionEngine
+from app.services.training_service import TrainingService
+
+
+def get_recognition_engine(request: Request) -> RecognitionEngine:
+    """Return the lifespan-scoped recognition engine"""
+    return request.app.state.recognition_engine
+
+
+def get_training_service(request: Request) -> TrainingService:
+    """Return the lifespan-scoped training service"""
+    return request.app.state.training_service
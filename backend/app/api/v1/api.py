@@ -2,10 +2,11 @@
 Main API router for v1 endpoints
 """
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 
 from app.api.v1.endpoints import students, attendance, recognition, training
 
-api_router = APIRouter()
+api_router = APIRouter(default_response_class=ORJSONResponse)
 
 # Include all endpoint routers
 api_router.include_router(students.router, prefix="/students", tags=["students"])
@@ -1,14 +1,17 @@
 """
 Attendance management API endpoints
 """
+import asyncio
 from typing import List, Optional
-from datetime import datetime, date
+from datetime import datetime, date, time, timedelta
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, insert, func, and_, desc, bindparam
 import structlog
 
-from app.core.database import get_db
+from app.core.database import get_db, AsyncSessionLocal
 from app.models.attendance_record import AttendanceRecord
 from app.models.student import Student
 from app.schemas.attendance import AttendanceResponse, AttendanceStats
@@ -16,6 +19,27 @@ from app.schemas.attendance import AttendanceResponse, AttendanceStats
 logger = structlog.get_logger(__name__)
 router = APIRouter()
 
+# Day boundary reused by every endpoint that expands a date into a
+# datetime range, instead of rebuilding time objects per request
+DAY_START = time.min
+
+# Invariant statements hoisted to module scope so their Core compilation
+# happens once instead of on every request
+COUNT_ACTIVE_STUDENTS = select(func.count(Student.id)).where(Student.is_active == True)
+ACTIVE_STUDENT_BY_ID = select(Student).where(
+    Student.id == bindparam('student_id'), Student.is_active == True
+)
+ACTIVE_STUDENT_INFO_BY_ID = select(Student.name, Student.roll_number).where(
+    Student.id == bindparam('student_id'), Student.is_active == True
+)
+
+
+async def _execute_on_own_session(query):
+    """Execute a query on a short-lived session so independent queries can run concurrently"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(query)
+        return result.all()
+
 
 @router.get("/", response_model=List[AttendanceResponse])
 async def get_attendance_records(
@@ -29,8 +53,24 @@ async def get_attendance_records(
 ):
     """Get attendance records with optional filters"""
     try:
-        query = select(AttendanceRecord).join(Student)
-        
+        # Select only the columns the response needs instead of hydrating
+        # full ORM entities; the student columns come from the same join,
+        # avoiding a lazy SELECT per record (N+1)
+        query = select(
+            AttendanceRecord.id,
+            AttendanceRecord.student_id,
+            AttendanceRecord.timestamp,
+            AttendanceRecord.confidence_score,
+            AttendanceRecord.location,
+            AttendanceRecord.session_id,
+            AttendanceRecord.subject_code,
+            AttendanceRecord.period,
+            AttendanceRecord.status,
+            AttendanceRecord.image_path,
+            Student.name.label("student_name"),
+            Student.roll_number.label("student_roll_number")
+        ).join(Student)
+
         # Apply filters
         if student_id:
             query = query.where(AttendanceRecord.student_id == student_id)
@@ -39,28 +79,33 @@ async def get_attendance_records(
             query = query.where(AttendanceRecord.timestamp >= date_from)
         
         if date_to:
-            # Add one day to include the entire end date
-            end_date = datetime.combine(date_to, datetime.max.time())
-            query = query.where(AttendanceRecord.timestamp <= end_date)
+            # Half-open bound on the start of the next day includes the
+            # entire end date and keeps the predicate index-friendly
+            end_date = datetime.combine(date_to + timedelta(days=1), DAY_START)
+            query = query.where(AttendanceRecord.timestamp < end_date)
         
         if subject_code:
             query = query.where(AttendanceRecord.subject_code == subject_code)
         
-        # Order by timestamp descending and apply pagination
+        # Order by timestamp descending and apply pagination; yield_per
+        # caps driver-side buffering so large limits stream in chunks
         query = query.order_by(desc(AttendanceRecord.timestamp)).offset(skip).limit(limit)
-        
-        result = await db.execute(query)
-        records = result.scalars().all()
-        
-        # Convert to response format with student info
-        response_records = []
-        for record in records:
-            record_dict = record.to_dict()
-            record_dict["student_name"] = record.student.name
-            record_dict["student_roll_number"] = record.student.roll_number
-            response_records.append(AttendanceResponse(**record_dict))
-        
-        return response_records
+        query = query.execution_options(yield_per=200)
+
+        result = await db.stream(query)
+
+        # Stream rows straight from the cursor into the response body so
+        # the full record list is never materialized in memory
+        async def render():
+            yield b"["
+            first = True
+            async for row in result.mappings():
+                prefix = b"" if first else b","
+                first = False
+                yield prefix + orjson.dumps(AttendanceResponse(**row).model_dump())
+            yield b"]"
+
+        return StreamingResponse(render(), media_type="application/json")
         
     except Exception as e:
         logger.error(f"Error fetching attendance records: {e}")
@@ -77,37 +122,46 @@ async def get_student_attendance(
     """Get attendance records for a specific student"""
     try:
         # Verify student exists
-        student_query = select(Student).where(Student.id == student_id, Student.is_active == True)
-        student_result = await db.execute(student_query)
+        student_result = await db.execute(ACTIVE_STUDENT_BY_ID, {"student_id": student_id})
         student = student_result.scalar_one_or_none()
         
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
         
-        # Build attendance query
-        query = select(AttendanceRecord).where(AttendanceRecord.student_id == student_id)
+        # Build attendance query over just the columns the response needs
+        query = select(
+            AttendanceRecord.id,
+            AttendanceRecord.student_id,
+            AttendanceRecord.timestamp,
+            AttendanceRecord.confidence_score,
+            AttendanceRecord.location,
+            AttendanceRecord.session_id,
+            AttendanceRecord.subject_code,
+            AttendanceRecord.period,
+            AttendanceRecord.status,
+            AttendanceRecord.image_path
+        ).where(AttendanceRecord.student_id == student_id)
         
         if date_from:
             query = query.where(AttendanceRecord.timestamp >= date_from)
         
         if date_to:
-            end_date = datetime.combine(date_to, datetime.max.time())
-            query = query.where(AttendanceRecord.timestamp <= end_date)
+            end_date = datetime.combine(date_to + timedelta(days=1), DAY_START)
+            query = query.where(AttendanceRecord.timestamp < end_date)
         
         query = query.order_by(desc(AttendanceRecord.timestamp))
         
         result = await db.execute(query)
-        records = result.scalars().all()
-        
+
         # Convert to response format
-        response_records = []
-        for record in records:
-            record_dict = record.to_dict()
-            record_dict["student_name"] = student.name
-            record_dict["student_roll_number"] = student.roll_number
-            response_records.append(AttendanceResponse(**record_dict))
-        
-        return response_records
+        return [
+            AttendanceResponse(
+                **row,
+                student_name=student.name,
+                student_roll_number=student.roll_number
+            )
+            for row in result.mappings()
+        ]
         
     except HTTPException:
         raise
@@ -123,54 +177,53 @@ async def get_daily_attendance_stats(
 ):
     """Get daily attendance statistics"""
     try:
-        # Get start and end of the target date
-        start_date = datetime.combine(target_date, datetime.min.time())
-        end_date = datetime.combine(target_date, datetime.max.time())
-        
-        # Total students
-        total_students_query = select(func.count(Student.id)).where(Student.is_active == True)
-        total_result = await db.execute(total_students_query)
-        total_students = total_result.scalar()
-        
-        # Students present today
-        present_query = select(func.count(func.distinct(AttendanceRecord.student_id))).where(
-            and_(
-                AttendanceRecord.timestamp >= start_date,
-                AttendanceRecord.timestamp <= end_date,
+        # Get the half-open [start of day, start of next day) range
+        start_date = datetime.combine(target_date, DAY_START)
+        end_date = datetime.combine(target_date + timedelta(days=1), DAY_START)
+        
+        # Day-wide headline counts as one row of conditional distinct
+        # aggregates: a student attending several subjects still counts
+        # once, and present/late share a single scan of the day's rows
+        headline_query = select(
+            func.count(func.distinct(AttendanceRecord.student_id)).filter(
                 AttendanceRecord.status == "present"
-            )
-        )
-        present_result = await db.execute(present_query)
-        students_present = present_result.scalar()
-        
-        # Students late today
-        late_query = select(func.count(func.distinct(AttendanceRecord.student_id))).where(
+            ).label('present'),
+            func.count(func.distinct(AttendanceRecord.student_id)).filter(
+                AttendanceRecord.status == "late"
+            ).label('late')
+        ).where(
             and_(
                 AttendanceRecord.timestamp >= start_date,
-                AttendanceRecord.timestamp <= end_date,
-                AttendanceRecord.status == "late"
+                AttendanceRecord.timestamp < end_date
             )
         )
-        late_result = await db.execute(late_query)
-        students_late = late_result.scalar()
-        
-        # Calculate attendance percentage
-        attendance_percentage = (students_present / total_students * 100) if total_students > 0 else 0
-        
-        # Subject-wise attendance
+
+        # The breakdown counts distinct students per subject, so a
+        # student with both a present and a late row in one subject
+        # still contributes one to that subject
         subject_query = select(
             AttendanceRecord.subject_code,
             func.count(func.distinct(AttendanceRecord.student_id)).label('count')
         ).where(
             and_(
                 AttendanceRecord.timestamp >= start_date,
-                AttendanceRecord.timestamp <= end_date,
+                AttendanceRecord.timestamp < end_date,
                 AttendanceRecord.subject_code.isnot(None)
             )
         ).group_by(AttendanceRecord.subject_code)
-        
-        subject_result = await db.execute(subject_query)
-        subject_attendance = {subject: count for subject, count in subject_result.all()}
+
+        # Run the queries concurrently on separate sessions
+        total_rows, headline_rows, subject_rows = await asyncio.gather(
+            _execute_on_own_session(COUNT_ACTIVE_STUDENTS),
+            _execute_on_own_session(headline_query),
+            _execute_on_own_session(subject_query)
+        )
+        total_students = total_rows[0][0]
+        students_present, students_late = headline_rows[0]
+        subject_attendance = {subject: count for subject, count in subject_rows}
+
+        # Calculate attendance percentage
+        attendance_percentage = (students_present / total_students * 100) if total_students > 0 else 0
         
         return {
             "date": target_date.isoformat(),
@@ -203,9 +256,7 @@ async def get_attendance_summary(
         total_records_query = select(func.count(AttendanceRecord.id)).where(
             AttendanceRecord.timestamp >= start_date
         )
-        total_result = await db.execute(total_records_query)
-        total_records = total_result.scalar()
-        
+
         # Average daily attendance
         daily_attendance_query = select(
             func.date(AttendanceRecord.timestamp).label('date'),
@@ -213,27 +264,41 @@ async def get_attendance_summary(
         ).where(
             AttendanceRecord.timestamp >= start_date
         ).group_by(func.date(AttendanceRecord.timestamp))
-        
-        daily_result = await db.execute(daily_attendance_query)
-        daily_attendance = daily_result.all()
-        
-        avg_daily_attendance = sum(count for _, count in daily_attendance) / len(daily_attendance) if daily_attendance else 0
-        
-        # Most active students
-        active_students_query = select(
-            Student.name,
-            Student.roll_number,
+
+        # Most active students: aggregate the attendance rows down to the
+        # top 10 ids first, then join Student against just those 10 rows
+        # instead of grouping the full join
+        top_students = select(
+            AttendanceRecord.student_id,
             func.count(AttendanceRecord.id).label('attendance_count')
-        ).join(AttendanceRecord).where(
+        ).where(
             AttendanceRecord.timestamp >= start_date
-        ).group_by(Student.id, Student.name, Student.roll_number).order_by(
+        ).group_by(AttendanceRecord.student_id).order_by(
             desc(func.count(AttendanceRecord.id))
-        ).limit(10)
-        
-        active_result = await db.execute(active_students_query)
+        ).limit(10).cte('top_students')
+
+        active_students_query = select(
+            Student.name,
+            Student.roll_number,
+            top_students.c.attendance_count
+        ).join(top_students, Student.id == top_students.c.student_id).order_by(
+            desc(top_students.c.attendance_count)
+        )
+
+        # The three queries are independent, so run them concurrently on
+        # separate sessions instead of paying their latency back-to-back
+        total_rows, daily_attendance, active_rows = await asyncio.gather(
+            _execute_on_own_session(total_records_query),
+            _execute_on_own_session(daily_attendance_query),
+            _execute_on_own_session(active_students_query)
+        )
+        total_records = total_rows[0][0]
+
+        avg_daily_attendance = sum(count for _, count in daily_attendance) / len(daily_attendance) if daily_attendance else 0
+
         most_active = [
             {"name": name, "roll_number": roll, "attendance_count": count}
-            for name, roll, count in active_result.all()
+            for name, roll, count in active_rows
         ]
         
         return {
@@ -265,38 +330,43 @@ async def record_attendance_manually(
 ):
     """Manually record attendance for a student"""
     try:
-        # Verify student exists
-        student_query = select(Student).where(Student.id == student_id, Student.is_active == True)
-        student_result = await db.execute(student_query)
-        student = student_result.scalar_one_or_none()
-        
+        # Verify student exists, fetching only the columns the response needs
+        student_result = await db.execute(ACTIVE_STUDENT_INFO_BY_ID, {"student_id": student_id})
+        student = student_result.one_or_none()
+
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
-        
-        # Create attendance record
-        attendance_record = AttendanceRecord(
+
+        # Insert the record and read back the server-generated id/timestamp
+        # in the same round-trip, so no refresh is needed after commit
+        insert_stmt = insert(AttendanceRecord).values(
             student_id=student_id,
             confidence_score=confidence_score,
             subject_code=subject_code,
             period=period,
             status=status,
             location="Manual Entry"
-        )
-        
-        db.add(attendance_record)
+        ).returning(AttendanceRecord.id, AttendanceRecord.timestamp)
+
+        record_id, record_timestamp = (await db.execute(insert_stmt)).one()
         await db.commit()
-        await db.refresh(attendance_record)
-        
+
         logger.info(f"Manually recorded attendance for student {student.name}")
-        
-        # Return response with student info
-        record_dict = attendance_record.to_dict()
-        record_dict["student_name"] = student.name
-        record_dict["student_roll_number"] = student.roll_number
-        
+
         return {
             "message": "Attendance recorded successfully",
-            "record": AttendanceResponse(**record_dict)
+            "record": AttendanceResponse(
+                id=record_id,
+                student_id=student_id,
+                timestamp=record_timestamp,
+                confidence_score=confidence_score,
+                subject_code=subject_code,
+                period=period,
+                status=status,
+                location="Manual Entry",
+                student_name=student.name,
+                student_roll_number=student.roll_number
+            )
         }
         
     except HTTPException:
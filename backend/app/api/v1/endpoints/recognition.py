@@ -7,9 +7,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import structlog
 import asyncio
-import json
+import orjson
+import time
 from datetime import datetime
 
+from app.api.deps import get_recognition_engine, get_training_service
 from app.core.database import get_db
 from app.models.student import Student
 from app.models.attendance_record import AttendanceRecord
@@ -19,23 +21,24 @@ from app.services.training_service import TrainingService
 logger = structlog.get_logger(__name__)
 router = APIRouter()
 
-# Global instances
-recognition_engine = RecognitionEngine()
-training_service = TrainingService()
+
+def _jdump(payload) -> bytes:
+    """Serialize a WebSocket payload with orjson (emits bytes directly)"""
+    return orjson.dumps(payload)
+
 
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: set[WebSocket] = set()
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.active_connections.add(websocket)
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
         logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
@@ -44,41 +47,82 @@ class ConnectionManager:
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
 
-    async def broadcast(self, message: str):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-                disconnected.append(connection)
-        
-        # Remove disconnected connections
-        for conn in disconnected:
-            self.disconnect(conn)
+    async def broadcast(self, message: bytes):
+        # Snapshot so a connect/disconnect during the sends cannot mutate
+        # the set mid-iteration; fan out concurrently so one slow client
+        # does not stall delivery to the others
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_bytes(message) for connection in connections),
+            return_exceptions=True
+        )
+
+        disconnected = [
+            connection
+            for connection, result in zip(connections, results)
+            if isinstance(result, Exception)
+        ]
+
+        if disconnected:
+            # Remove disconnected connections in one pass, with a single
+            # log line instead of one per dead socket during mass drops
+            self.active_connections.difference_update(disconnected)
+            logger.info(f"Broadcast removed {len(disconnected)} dead connections. "
+                        f"Total connections: {len(self.active_connections)}")
 
 manager = ConnectionManager()
 
+# Short-lived cache for the status payload, which is polled heavily over
+# both REST and per-WebSocket get_status messages; the lock coalesces
+# concurrent cache misses into a single rebuild
+_STATUS_CACHE_TTL = 1.0
+_status_cache = {"expires_at": 0.0, "payload": None}
+_status_cache_lock = asyncio.Lock()
+
+
+def _invalidate_status_cache():
+    """Force the next status request to rebuild the payload"""
+    _status_cache["expires_at"] = 0.0
+
+
+def _status_snapshot(
+    recognition_engine: RecognitionEngine,
+    training_service: TrainingService
+) -> dict:
+    """Build the status payload purely from in-memory state (no I/O)"""
+    known_faces_count = recognition_engine.known_face_count
+
+    return {
+        "status": "online" if known_faces_count > 0 else "no_training_data",
+        "known_faces_count": known_faces_count,
+        "recognition_threshold": recognition_engine.recognition_threshold,
+        "active_websocket_connections": len(manager.active_connections),
+        "training_status": training_service.training_status,
+        "last_updated": datetime.now().isoformat()
+    }
+
 
 @router.get("/status")
-async def get_recognition_status():
+async def get_recognition_status(
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine),
+    training_service: TrainingService = Depends(get_training_service)
+):
     """Get current recognition system status"""
     try:
-        # Check if recognition engine has loaded faces
-        known_faces_count = len(recognition_engine.known_faces)
-        
-        # Get training status
-        training_status = await training_service.get_training_status()
-        
-        return {
-            "status": "online" if known_faces_count > 0 else "no_training_data",
-            "known_faces_count": known_faces_count,
-            "recognition_threshold": recognition_engine.recognition_threshold,
-            "active_websocket_connections": len(manager.active_connections),
-            "training_status": training_status["status"],
-            "last_updated": datetime.now().isoformat()
-        }
-        
+        if _status_cache["payload"] is not None and time.monotonic() < _status_cache["expires_at"]:
+            return _status_cache["payload"]
+
+        async with _status_cache_lock:
+            # Another caller may have rebuilt the payload while we waited
+            if _status_cache["payload"] is not None and time.monotonic() < _status_cache["expires_at"]:
+                return _status_cache["payload"]
+
+            payload = _status_snapshot(recognition_engine, training_service)
+
+            _status_cache["payload"] = payload
+            _status_cache["expires_at"] = time.monotonic() + _STATUS_CACHE_TTL
+            return payload
+
     except Exception as e:
         logger.error(f"Error getting recognition status: {e}")
         raise HTTPException(status_code=500, detail="Failed to get recognition status")
@@ -89,7 +133,9 @@ async def start_recognition_session(
     session_id: Optional[str] = None,
     location: Optional[str] = None,
     subject_code: Optional[str] = None,
-    period: Optional[str] = None
+    period: Optional[str] = None,
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine),
+    training_service: TrainingService = Depends(get_training_service)
 ):
     """Start a new recognition session"""
     try:
@@ -97,11 +143,11 @@ async def start_recognition_session(
             session_id = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
         # Ensure recognition engine has training data
-        if len(recognition_engine.known_faces) == 0:
+        if recognition_engine.known_face_count == 0:
             # Try to load from database
             await training_service._update_recognition_engine()
             
-            if len(recognition_engine.known_faces) == 0:
+            if recognition_engine.known_face_count == 0:
                 raise HTTPException(
                     status_code=400, 
                     detail="No training data available. Please train the model first."
@@ -117,8 +163,9 @@ async def start_recognition_session(
             "timestamp": datetime.now().isoformat()
         }
         
-        await manager.broadcast(json.dumps(session_data))
-        
+        await manager.broadcast(_jdump(session_data))
+        _invalidate_status_cache()
+
         logger.info(f"Started recognition session: {session_id}")
         
         return {
@@ -127,7 +174,7 @@ async def start_recognition_session(
             "location": location,
             "subject_code": subject_code,
             "period": period,
-            "known_faces_count": len(recognition_engine.known_faces)
+            "known_faces_count": recognition_engine.known_face_count
         }
         
     except HTTPException:
@@ -148,8 +195,9 @@ async def stop_recognition_session(session_id: str):
             "timestamp": datetime.now().isoformat()
         }
         
-        await manager.broadcast(json.dumps(session_data))
-        
+        await manager.broadcast(_jdump(session_data))
+        _invalidate_status_cache()
+
         logger.info(f"Stopped recognition session: {session_id}")
         
         return {
@@ -182,25 +230,33 @@ async def simulate_recognition(
         
         # Simulate recognition events
         import random
-        simulated_recognitions = []
-        
+        recognized_students = []
+        attendance_records = []
+
         for _ in range(random.randint(1, 3)):  # Simulate 1-3 recognitions
             student = random.choice(students)
             confidence = random.uniform(0.7, 0.95)  # Random confidence score
-            
-            # Create attendance record
-            attendance_record = AttendanceRecord(
+            recognized_students.append((student, confidence))
+
+            attendance_records.append(AttendanceRecord(
                 student_id=student.id,
                 confidence_score=confidence,
                 session_id=session_id,
                 location="Simulation",
                 status="present"
-            )
-            
-            db.add(attendance_record)
-            await db.commit()
-            await db.refresh(attendance_record)
-            
+            ))
+
+        # Persist all records in one transaction instead of committing
+        # (and refreshing) once per record; ids are populated on flush
+        db.add_all(attendance_records)
+        await db.commit()
+
+        simulated_recognitions = []
+
+        for (student, confidence), attendance_record in zip(recognized_students, attendance_records):
+            # One timestamp per recognition event, reused everywhere the
+            # event is referenced
+            event_timestamp = datetime.now().isoformat()
             recognition_data = {
                 "type": "face_recognized",
                 "student_id": student.id,
@@ -208,15 +264,15 @@ async def simulate_recognition(
                 "roll_number": student.roll_number,
                 "confidence": confidence,
                 "session_id": session_id,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": event_timestamp,
                 "attendance_id": attendance_record.id
             }
-            
+
             simulated_recognitions.append(recognition_data)
-            
+
             # Broadcast recognition event
-            await manager.broadcast(json.dumps(recognition_data))
-            
+            await manager.broadcast(_jdump(recognition_data))
+
             # Small delay between recognitions
             await asyncio.sleep(0.5)
         
@@ -242,7 +298,7 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         # Send initial connection confirmation
-        await websocket.send_text(json.dumps({
+        await websocket.send_bytes(_jdump({
             "type": "connection_established",
             "message": "Connected to face recognition system",
             "timestamp": datetime.now().isoformat()
@@ -253,17 +309,20 @@ async def websocket_endpoint(websocket: WebSocket):
             try:
                 # Wait for messages from client
                 data = await websocket.receive_text()
-                message = json.loads(data)
+                message = orjson.loads(data)
                 
                 # Handle different message types
                 if message.get("type") == "ping":
-                    await websocket.send_text(json.dumps({
+                    await websocket.send_bytes(_jdump({
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
                     }))
                 elif message.get("type") == "get_status":
-                    status = await get_recognition_status()
-                    await websocket.send_text(json.dumps({
+                    status = _status_snapshot(
+                        websocket.app.state.recognition_engine,
+                        websocket.app.state.training_service
+                    )
+                    await websocket.send_bytes(_jdump({
                         "type": "status_update",
                         "data": status,
                         "timestamp": datetime.now().isoformat()
@@ -273,7 +332,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 break
             except Exception as e:
                 logger.error(f"Error handling WebSocket message: {e}")
-                await websocket.send_text(json.dumps({
+                await websocket.send_bytes(_jdump({
                     "type": "error",
                     "message": str(e),
                     "timestamp": datetime.now().isoformat()
@@ -305,7 +364,7 @@ async def broadcast_message(message: str, message_type: str = "announcement"):
             "timestamp": datetime.now().isoformat()
         }
         
-        await manager.broadcast(json.dumps(broadcast_data))
+        await manager.broadcast(_jdump(broadcast_data))
         
         return {
             "message": "Message broadcasted successfully",
@@ -1,12 +1,23 @@
 """
 Student management API endpoints
 """
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, bindparam, lambda_stmt
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from pydantic import TypeAdapter
 import structlog
 
+from app.api.deps import get_training_service
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.student import Student
 from app.models.face_embedding import FaceEmbedding
@@ -16,35 +27,103 @@ from app.schemas.student import StudentCreate, StudentResponse, StudentUpdate
 logger = structlog.get_logger(__name__)
 router = APIRouter()
 
-# Global training service instance
-training_service = TrainingService()
+# Upload handling: files are streamed to disk in fixed-size chunks so a
+# request never holds more than one chunk per file in memory, and the
+# semaphore bounds how many CPU-heavy enrollments run at once
+_UPLOAD_CHUNK_SIZE = 1024 * 1024
+enrollment_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_ENROLLMENTS)
 
+# Cache for the statistics payload, which is dashboard data that changes
+# only when students or embeddings do; mutations invalidate it so reads
+# between writes skip the four aggregate queries entirely
+_STATS_CACHE_TTL = 120.0
+_stats_cache = {"expires_at": 0.0, "payload": None}
+_stats_cache_lock = asyncio.Lock()
 
-@router.get("/", response_model=List[StudentResponse])
+
+def _invalidate_stats_cache():
+    """Force the next statistics request to re-run the aggregates"""
+    _stats_cache["expires_at"] = 0.0
+
+
+# Separator for the keyset cursor; a unit separator cannot appear in
+# names, so the cursor splits back unambiguously
+_CURSOR_SEP = "\x1f"
+
+# Compiled once: validates the whole student list in a single pass
+# instead of a per-row from_orm call
+_student_list_adapter = TypeAdapter(List[StudentResponse])
+
+# Invariant statement hoisted to module scope so its Core compilation
+# happens once; shared by the get/update/delete handlers
+_GET_STUDENT_BY_ID = select(Student).where(
+    Student.id == bindparam('student_id'), Student.is_active == True
+)
+
+
+@router.get("/")
 async def get_students(
-    skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
+    after: Optional[str] = None,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get list of students with optional search"""
+    """Get list of students with optional search, paged by keyset cursor"""
     try:
-        query = select(Student).where(Student.is_active == True)
-        
+        # lambda_stmt caches the compiled statement per lambda code
+        # object, so each filter combination pays Core-to-SQL compilation
+        # once; the closure variables become bound parameters.
+        # The outer join aggregates embedding counts in the same
+        # statement, so the list never needs a per-student lookup (N+1)
+        query = lambda_stmt(
+            lambda: select(
+                Student,
+                func.count(FaceEmbedding.id).label('embedding_count')
+            ).outerjoin(FaceEmbedding).where(Student.is_active == True)
+        )
+
         if search:
             search_term = f"%{search}%"
-            query = query.where(
+            query += lambda s: s.where(
                 (Student.name.ilike(search_term)) |
                 (Student.student_number.ilike(search_term)) |
                 (Student.roll_number.ilike(search_term))
             )
-        
-        query = query.offset(skip).limit(limit).order_by(Student.name)
+
+        if after:
+            # Keyset pagination: seek past the last row of the previous
+            # page instead of scanning and discarding OFFSET rows, so
+            # deep pages cost the same as the first one. Spelled out as
+            # the expanded row comparison because lambda statements
+            # can't track a tuple-valued closure variable
+            last_name, _, last_id = after.rpartition(_CURSOR_SEP)
+            query += lambda s: s.where(
+                (Student.name > last_name) |
+                ((Student.name == last_name) & (Student.id > last_id))
+            )
+
+        query += lambda s: s.group_by(Student.id).order_by(
+            Student.name, Student.id
+        ).limit(limit)
+
         result = await db.execute(query)
-        students = result.scalars().all()
-        
-        return [StudentResponse.from_orm(student) for student in students]
-        
+        rows = result.all()
+        students = [row.Student for row in rows]
+
+        next_cursor = None
+        if len(students) == limit:
+            last = students[-1]
+            next_cursor = f"{last.name}{_CURSOR_SEP}{last.id}"
+
+        payload = _student_list_adapter.validate_python(students, from_attributes=True)
+        for item, row in zip(payload, rows):
+            item.embedding_count = row.embedding_count
+
+        return {
+            "students": payload,
+            "next_cursor": next_cursor
+        }
+
     except Exception as e:
         logger.error(f"Error fetching students: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch students")
@@ -54,14 +133,13 @@ async def get_students(
 async def get_student(student_id: str, db: AsyncSession = Depends(get_db)):
     """Get a specific student by ID"""
     try:
-        stmt = select(Student).where(Student.id == student_id, Student.is_active == True)
-        result = await db.execute(stmt)
+        result = await db.execute(_GET_STUDENT_BY_ID, {"student_id": student_id})
         student = result.scalar_one_or_none()
         
         if not student:
             raise HTTPException(status_code=404, detail="Student not found")
-        
-        return StudentResponse.from_orm(student)
+
+        return StudentResponse.model_validate(student)
         
     except HTTPException:
         raise
@@ -77,29 +155,29 @@ async def create_student(
 ):
     """Create a new student"""
     try:
-        # Check if student already exists
-        existing_query = select(Student).where(
-            (Student.name == student_data.name) |
-            (Student.student_number == student_data.student_number) |
-            (Student.roll_number == student_data.roll_number)
-        )
-        result = await db.execute(existing_query)
-        existing_student = result.scalar_one_or_none()
-        
-        if existing_student:
+        # Single INSERT ... ON CONFLICT DO NOTHING instead of a SELECT
+        # existence check followed by an INSERT: one round-trip, and the
+        # unique indexes close the race window between check and insert
+        dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
+        stmt = dialect_insert(Student).values(
+            **student_data.dict()
+        ).on_conflict_do_nothing().returning(Student)
+
+        result = await db.execute(stmt)
+        student = result.scalar_one_or_none()
+
+        if student is None:
+            await db.rollback()
             raise HTTPException(
-                status_code=400, 
+                status_code=400,
                 detail="Student with this name, student number, or roll number already exists"
             )
-        
-        # Create new student
-        student = Student(**student_data.dict())
-        db.add(student)
+
         await db.commit()
-        await db.refresh(student)
-        
+        _invalidate_stats_cache()
+
         logger.info(f"Created new student: {student.name} (ID: {student.id})")
-        return StudentResponse.from_orm(student)
+        return StudentResponse.model_validate(student)
         
     except HTTPException:
         raise
@@ -117,8 +195,7 @@ async def update_student(
 ):
     """Update an existing student"""
     try:
-        stmt = select(Student).where(Student.id == student_id, Student.is_active == True)
-        result = await db.execute(stmt)
+        result = await db.execute(_GET_STUDENT_BY_ID, {"student_id": student_id})
         student = result.scalar_one_or_none()
         
         if not student:
@@ -131,9 +208,10 @@ async def update_student(
         
         await db.commit()
         await db.refresh(student)
-        
+        _invalidate_stats_cache()
+
         logger.info(f"Updated student: {student.name} (ID: {student.id})")
-        return StudentResponse.from_orm(student)
+        return StudentResponse.model_validate(student)
         
     except HTTPException:
         raise
@@ -147,8 +225,7 @@ async def update_student(
 async def delete_student(student_id: str, db: AsyncSession = Depends(get_db)):
     """Soft delete a student (mark as inactive)"""
     try:
-        stmt = select(Student).where(Student.id == student_id, Student.is_active == True)
-        result = await db.execute(stmt)
+        result = await db.execute(_GET_STUDENT_BY_ID, {"student_id": student_id})
         student = result.scalar_one_or_none()
         
         if not student:
@@ -157,7 +234,8 @@ async def delete_student(student_id: str, db: AsyncSession = Depends(get_db)):
         # Soft delete by marking as inactive
         student.is_active = False
         await db.commit()
-        
+        _invalidate_stats_cache()
+
         logger.info(f"Deleted student: {student.name} (ID: {student.id})")
         return {"message": "Student deleted successfully"}
         
@@ -171,6 +249,7 @@ async def delete_student(student_id: str, db: AsyncSession = Depends(get_db)):
 
 @router.post("/enroll")
 async def enroll_student_with_images(
+    request: Request,
     name: str = Form(...),
     student_number: Optional[str] = Form(None),
     roll_number: Optional[str] = Form(None),
@@ -179,36 +258,69 @@ async def enroll_student_with_images(
     year: Optional[int] = Form(None),
     section: Optional[str] = Form(None),
     phone: Optional[str] = Form(None),
-    images: List[UploadFile] = File(...)
+    images: List[UploadFile] = File(...),
+    training_service: TrainingService = Depends(get_training_service)
 ):
     """Enroll a student with face images for training"""
     try:
         if not images:
             raise HTTPException(status_code=400, detail="At least one image is required")
-        
+
+        if len(images) > settings.MAX_ENROLL_IMAGES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many images (max {settings.MAX_ENROLL_IMAGES} per enrollment)"
+            )
+
+
         # Validate image files
         valid_types = {"image/jpeg", "image/jpg", "image/png"}
-        image_bytes_list = []
-        
+
         for image in images:
             if image.content_type not in valid_types:
                 raise HTTPException(
-                    status_code=400, 
+                    status_code=400,
                     detail=f"Invalid image type: {image.content_type}. Supported: JPEG, PNG"
                 )
-            
-            content = await image.read()
-            if len(content) > 10 * 1024 * 1024:  # 10MB limit
-                raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
-            
-            image_bytes_list.append(content)
-        
-        # Enroll student using training service
-        result = await training_service.enroll_single_student(name, image_bytes_list)
-        
+
+        image_paths = []
+
+        try:
+            # Stream each upload to a temp file chunk by chunk instead of
+            # buffering every file into memory; oversize files are
+            # rejected as soon as they cross the limit
+            for image in images:
+                suffix = ".png" if image.content_type == "image/png" else ".jpg"
+                total_size = 0
+
+                with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+                    image_paths.append(tmp.name)
+
+                    while chunk := await image.read(_UPLOAD_CHUNK_SIZE):
+                        total_size += len(chunk)
+                        if total_size > settings.MAX_FILE_SIZE:
+                            raise HTTPException(
+                                status_code=400, detail="Image file too large (max 10MB)"
+                            )
+                        tmp.write(chunk)
+
+            # Enroll student using training service; the CPU-bound
+            # extraction runs on the shared process pool
+            async with enrollment_semaphore:
+                result = await training_service.enroll_single_student(
+                    name, image_paths, executor=request.app.state.enroll_pool
+                )
+        finally:
+            for path in image_paths:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["message"])
-        
+
+        _invalidate_stats_cache()
         logger.info(f"Successfully enrolled student {name} with {len(images)} images")
         
         return {
@@ -224,40 +336,83 @@ async def enroll_student_with_images(
         raise HTTPException(status_code=500, detail="Failed to enroll student")
 
 
+def _stats_etag(payload: dict) -> str:
+    """Derive a validator from a statistics payload
+
+    The whole serialized payload is hashed so the tag changes whenever
+    any part of the representation does — including the per-department
+    breakdown, which can change while the headline counts stay equal.
+    """
+    return hashlib.blake2b(
+        json.dumps(payload, sort_keys=True, default=str).encode(),
+        digest_size=8
+    ).hexdigest()
+
+
 @router.get("/stats/summary")
-async def get_student_statistics(db: AsyncSession = Depends(get_db)):
+async def get_student_statistics(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
     """Get student statistics summary"""
     try:
-        # Total active students
-        total_students_query = select(func.count(Student.id)).where(Student.is_active == True)
-        total_result = await db.execute(total_students_query)
-        total_students = total_result.scalar()
-        
-        # Students with face embeddings
-        students_with_faces_query = select(func.count(func.distinct(FaceEmbedding.student_id)))
-        faces_result = await db.execute(students_with_faces_query)
-        students_with_faces = faces_result.scalar()
-        
-        # Total face embeddings
-        total_embeddings_query = select(func.count(FaceEmbedding.id))
-        embeddings_result = await db.execute(total_embeddings_query)
-        total_embeddings = embeddings_result.scalar()
-        
-        # Students by department
-        dept_query = select(Student.department, func.count(Student.id)).where(
-            Student.is_active == True
-        ).group_by(Student.department)
-        dept_result = await db.execute(dept_query)
-        departments = {dept: count for dept, count in dept_result.all()}
-        
-        return {
-            "total_students": total_students,
-            "students_with_face_data": students_with_faces,
-            "total_face_embeddings": total_embeddings,
-            "students_by_department": departments,
-            "recognition_ready": students_with_faces > 0
-        }
-        
+        if _stats_cache["payload"] is None or time.monotonic() >= _stats_cache["expires_at"]:
+            async with _stats_cache_lock:
+                # Another caller may have rebuilt the payload while we waited
+                if _stats_cache["payload"] is None or time.monotonic() >= _stats_cache["expires_at"]:
+                    _stats_cache["payload"] = await _build_student_statistics(db)
+                    _stats_cache["expires_at"] = time.monotonic() + _STATS_CACHE_TTL
+
+        payload = _stats_cache["payload"]
+
+        # Polling dashboards mostly see unchanged counts; a matching ETag
+        # saves them the body and us the serialization
+        etag = _stats_etag(payload)
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "max-age=10"
+        return payload
+
     except Exception as e:
         logger.error(f"Error fetching student statistics: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch statistics")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Failed to fetch statistics")
+
+
+async def _build_student_statistics(db: AsyncSession) -> dict:
+    """Run the statistics aggregates (cache-miss path)"""
+    # All four aggregates in one statement and one round-trip: the
+    # per-department GROUP BY drives the rows, and the global counts ride
+    # along as scalar subqueries the planner evaluates once
+    total_students_subq = select(func.count(Student.id)).where(
+        Student.is_active == True
+    ).scalar_subquery()
+    students_with_faces_subq = select(
+        func.count(func.distinct(FaceEmbedding.student_id))
+    ).scalar_subquery()
+    total_embeddings_subq = select(func.count(FaceEmbedding.id)).scalar_subquery()
+
+    stats_query = select(
+        Student.department,
+        func.count(Student.id).label('dept_count'),
+        total_students_subq.label('total_students'),
+        students_with_faces_subq.label('students_with_faces'),
+        total_embeddings_subq.label('total_embeddings')
+    ).where(Student.is_active == True).group_by(Student.department)
+
+    rows = (await db.execute(stats_query)).all()
+
+    total_students = rows[0].total_students if rows else 0
+    students_with_faces = rows[0].students_with_faces if rows else 0
+    total_embeddings = rows[0].total_embeddings if rows else 0
+    departments = {row.department: row.dept_count for row in rows}
+
+    return {
+        "total_students": total_students,
+        "students_with_face_data": students_with_faces,
+        "total_face_embeddings": total_embeddings,
+        "students_by_department": departments,
+        "recognition_ready": students_with_faces > 0
+    }
\ No newline at end of file
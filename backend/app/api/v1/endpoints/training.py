@@ -1,10 +1,14 @@
 """
 Training and dataset management API endpoints
 """
+import asyncio
+import hashlib
+import json
 from typing import Dict, Any
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
 import structlog
 
+from app.api.deps import get_recognition_engine, get_training_service
 from app.services.training_service import TrainingService
 from app.services.dataset_processor import DatasetProcessor
 from app.services.recognition_engine import RecognitionEngine
@@ -12,13 +16,12 @@ from app.services.recognition_engine import RecognitionEngine
 logger = structlog.get_logger(__name__)
 router = APIRouter()
 
-# Global service instances
-training_service = TrainingService()
-recognition_engine = RecognitionEngine()
-
 
 @router.post("/train-from-datasets")
-async def train_from_datasets(background_tasks: BackgroundTasks):
+async def train_from_datasets(
+    background_tasks: BackgroundTasks,
+    training_service: TrainingService = Depends(get_training_service)
+):
     """Train face recognition model from student photo datasets"""
     try:
         # Check if training is already in progress
@@ -44,7 +47,9 @@ async def train_from_datasets(background_tasks: BackgroundTasks):
 
 
 @router.get("/status")
-async def get_training_status():
+async def get_training_status(
+    training_service: TrainingService = Depends(get_training_service)
+):
     """Get current training status and dataset information"""
     try:
         status = await training_service.get_training_status()
@@ -56,11 +61,15 @@ async def get_training_status():
 
 
 @router.get("/dataset/validate")
-async def validate_dataset():
+async def validate_dataset(
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine)
+):
     """Validate dataset structure and provide recommendations"""
     try:
         dataset_processor = DatasetProcessor(recognition_engine)
-        validation_results = dataset_processor.validate_dataset_structure()
+        # Directory walk runs in a worker thread so a large dataset
+        # doesn't block the event loop
+        validation_results = await asyncio.to_thread(dataset_processor.validate_dataset_structure)
         
         return {
             "validation_results": validation_results,
@@ -73,7 +82,9 @@ async def validate_dataset():
 
 
 @router.get("/dataset/statistics")
-async def get_dataset_statistics():
+async def get_dataset_statistics(
+    training_service: TrainingService = Depends(get_training_service)
+):
     """Get comprehensive dataset statistics"""
     try:
         stats = await training_service.get_dataset_statistics()
@@ -85,11 +96,13 @@ async def get_dataset_statistics():
 
 
 @router.post("/dataset/scan")
-async def scan_dataset():
+async def scan_dataset(
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine)
+):
     """Scan dataset directory for student folders and images"""
     try:
         dataset_processor = DatasetProcessor(recognition_engine)
-        student_data = dataset_processor.scan_student_folders()
+        student_data = await asyncio.to_thread(dataset_processor.scan_student_folders)
         
         total_students = len(student_data)
         total_images = sum(len(images) for images in student_data.values())
@@ -113,11 +126,13 @@ async def scan_dataset():
 
 
 @router.post("/dataset/create-sample")
-async def create_sample_dataset():
+async def create_sample_dataset(
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine)
+):
     """Create sample dataset structure with example folders"""
     try:
         dataset_processor = DatasetProcessor(recognition_engine)
-        dataset_processor.create_sample_dataset_structure()
+        await asyncio.to_thread(dataset_processor.create_sample_dataset_structure)
         
         return {
             "success": True,
@@ -138,12 +153,15 @@ async def create_sample_dataset():
 
 
 @router.post("/model/reload")
-async def reload_recognition_model():
+async def reload_recognition_model(
+    training_service: TrainingService = Depends(get_training_service),
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine)
+):
     """Reload the recognition model with latest training data"""
     try:
         await training_service._update_recognition_engine()
         
-        known_faces_count = len(recognition_engine.known_faces)
+        known_faces_count = recognition_engine.known_face_count
         
         return {
             "success": True,
@@ -158,19 +176,40 @@ async def reload_recognition_model():
 
 
 @router.get("/model/info")
-async def get_model_info():
+async def get_model_info(
+    request: Request,
+    response: Response,
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine)
+):
     """Get information about the current recognition model"""
     try:
-        return {
-            "known_faces_count": len(recognition_engine.known_faces),
+        payload = {
+            "known_faces_count": recognition_engine.known_face_count,
             "recognition_threshold": recognition_engine.recognition_threshold,
-            "model_loaded": len(recognition_engine.known_faces) > 0,
+            "model_loaded": recognition_engine.known_face_count > 0,
             "students_in_model": list(recognition_engine.known_faces.keys()),
             "embeddings_per_student": {
-                student_id: len(embeddings) 
+                student_id: len(embeddings)
                 for student_id, embeddings in recognition_engine.known_faces.items()
             }
         }
+
+        # Model state only changes on reload or threshold updates, so
+        # polling dashboards can short-circuit with a 304 most of the
+        # time. The whole payload is hashed so a retrain that swaps
+        # students while keeping the counts equal still changes the tag
+        etag = hashlib.blake2b(
+            json.dumps(payload, sort_keys=True, default=str).encode(),
+            digest_size=8
+        ).hexdigest()
+
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "max-age=10"
+
+        return payload
         
     except Exception as e:
         logger.error(f"Error getting model info: {e}")
@@ -178,7 +217,10 @@ async def get_model_info():
 
 
 @router.post("/model/update-threshold")
-async def update_recognition_threshold(threshold: float):
+async def update_recognition_threshold(
+    threshold: float,
+    recognition_engine: RecognitionEngine = Depends(get_recognition_engine)
+):
     """Update the face recognition threshold"""
     try:
         if not 0.0 <= threshold <= 1.0:
@@ -1,20 +1,40 @@
 """
 Database configuration and session management
 """
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
 import structlog
 
 from app.core.config import settings
 
 logger = structlog.get_logger(__name__)
 
+# Pool sizing applies to server databases; SQLite connections are plain
+# file handles, so pooling them just pins the single writer lock
+# query_cache_size widens the compiled-statement LRU beyond the default
+# so hot statement shapes never fall out under mixed endpoint traffic
+_engine_kwargs = dict(echo=settings.SQL_ECHO, future=True, query_cache_size=1200)
+
+_db_url = settings.DATABASE_URL
+
+if _db_url.startswith("sqlite"):
+    _engine_kwargs["poolclass"] = NullPool
+else:
+    _engine_kwargs.update(
+        pool_size=20,
+        max_overflow=40,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+if _db_url.startswith("postgresql+asyncpg") and "prepared_statement_cache_size" not in _db_url:
+    # Let asyncpg reuse server-side prepared statements across requests
+    _db_url += ("&" if "?" in _db_url else "?") + "prepared_statement_cache_size=256"
+
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    future=True,
-)
+engine = create_async_engine(_db_url, **_engine_kwargs)
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -31,11 +51,9 @@ class Base(DeclarativeBase):
 
 async def get_db() -> AsyncSession:
     """Dependency to get database session"""
+    # The context manager already closes the session on exit
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+        yield session
 
 
 async def init_db() -> None:
@@ -47,7 +65,48 @@ async def init_db() -> None:
             
             # Create all tables
             await conn.run_sync(Base.metadata.create_all)
-            
+
+            # Composite index covering the timestamp-range + student filters
+            # used by the attendance endpoints
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_attendance_timestamp_student "
+                "ON attendance_records (timestamp DESC, student_id)"
+            ))
+
+            # Expression index matching the per-day GROUP BY in the
+            # attendance summary endpoint
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_attendance_day "
+                "ON attendance_records ((date(timestamp)))"
+            ))
+
+            # Composite index serving the keyset-paginated student list
+            # (ORDER BY name, id over active rows)
+            await conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_students_active_name_id "
+                "ON students (name, id) WHERE is_active"
+            ))
+
+            # Partial unique indexes backing the ON CONFLICT path in
+            # create_student; scoped to active rows so soft-deleted
+            # students don't block re-enrollment under the same identity
+            for column in ("name", "student_number", "roll_number"):
+                await conn.execute(text(
+                    f"CREATE UNIQUE INDEX IF NOT EXISTS ux_students_{column}_active "
+                    f"ON students ({column}) WHERE is_active"
+                ))
+
+            if conn.dialect.name == "postgresql":
+                # Trigram indexes let the leading-wildcard ILIKE search in
+                # get_students use an index probe instead of a full scan;
+                # SQLite has no equivalent, so it keeps the plain scan
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for column in ("name", "student_number", "roll_number"):
+                    await conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_students_{column}_trgm "
+                        f"ON students USING gin ({column} gin_trgm_ops)"
+                    ))
+
         logger.info("Database tables created successfully")
         
     except Exception as e:
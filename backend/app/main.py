@@ -2,16 +2,21 @@
 Face Recognition Backend System - Main Application
 """
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import structlog
 
 from app.core.config import settings
 from app.core.database import init_db
 from app.api.v1.api import api_router
 from app.core.logging_config import setup_logging
+from app.services.recognition_engine import RecognitionEngine
+from app.services.training_service import TrainingService
 
 # Setup structured logging
 setup_logging()
@@ -26,9 +31,20 @@ async def lifespan(app: FastAPI):
     # Initialize database
     await init_db()
     logger.info("Database initialized")
-    
+
+    # One recognition engine and one training service shared by every
+    # endpoint, so the loaded embeddings exist in memory exactly once
+    # and training status is consistent across routers
+    app.state.recognition_engine = RecognitionEngine()
+    app.state.training_service = TrainingService(app.state.recognition_engine)
+
+    # Worker pool for CPU-bound enrollment work (face detection and
+    # embedding extraction), so uploads don't pin the event loop
+    app.state.enroll_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+
     yield
-    
+
+    app.state.enroll_pool.shutdown()
     logger.info("Shutting down Face Recognition Backend System")
 
 
@@ -38,6 +54,9 @@ app = FastAPI(
     description="Real-time face recognition for attendance monitoring",
     version="1.0.0",
     lifespan=lifespan,
+    # orjson serializes responses several times faster than the default
+    # json encoder, which matters most on the large list endpoints
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
 )
@@ -51,6 +70,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def limit_request_body_size(request, call_next):
+    """Reject oversized requests from their headers, before any body is read"""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > settings.MAX_REQUEST_BODY_SIZE:
+            return ORJSONResponse(
+                status_code=413,
+                content={"detail": "Request body too large"}
+            )
+    return await call_next(request)
+
+
 # Include API routes
 app.include_router(api_router, prefix="/api/v1")
 
@@ -73,13 +105,13 @@ async def http_exception_handler(request, exc):
                 detail=exc.detail,
                 path=request.url.path)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": {
                 "code": exc.status_code,
                 "message": exc.detail,
-                "timestamp": structlog.get_logger().info("timestamp")
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
         }
     )
@@ -93,13 +125,13 @@ async def general_exception_handler(request, exc):
                 path=request.url.path,
                 exc_info=True)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": {
                 "code": 500,
                 "message": "Internal server error",
-                "timestamp": structlog.get_logger().info("timestamp")
+                "timestamp": datetime.now(timezone.utc).isoformat()
             }
         }
     )
@@ -112,5 +144,10 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=settings.PORT,
         reload=settings.DEBUG,
-        log_level="info"
+        log_level="info",
+        # uvloop/httptools ship with uvicorn[standard] and cut per-event
+        # loop overhead, which matters for the WebSocket fanout paths
+        loop="uvloop",
+        http="httptools",
+        ws="websockets"
     )
\ No newline at end of file
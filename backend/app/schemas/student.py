@@ -42,6 +42,7 @@ class StudentResponse(StudentBase):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
     is_active: bool
+    embedding_count: int = 0
     
     class Config:
         from_attributes = True
\ No newline at end of file
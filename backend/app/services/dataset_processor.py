@@ -1,10 +1,14 @@
 """
 Dataset processor for training face recognition from student photo folders
 """
+import hashlib
+import mmap
 import os
 import cv2
 import numpy as np
-from typing import List, Dict, Tuple, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Dict, Tuple, Optional
 from pathlib import Path
 import structlog
 from PIL import Image
@@ -12,8 +16,53 @@ from PIL import Image
 from app.services.recognition_engine import RecognitionEngine
 from app.core.config import settings
 
+# libjpeg-turbo decodes JPEGs roughly twice as fast as cv2.imread and
+# can emit RGB directly, skipping the BGR->RGB pass; cv2 remains the
+# fallback when the binding or native library is absent
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+except ImportError:
+    TurboJPEG = None
+
 logger = structlog.get_logger(__name__)
 
+# Per-process state for the dataset workers: each ProcessPoolExecutor
+# worker loads the face detection models once and reuses them across
+# every student it is handed
+_student_worker: Optional["DatasetProcessor"] = None
+
+
+# How many images to read+decode ahead of the detector; bounded so a
+# student with hundreds of photos doesn't hold them all decoded at once
+_PREFETCH_DEPTH = 4
+
+# Extensions in both common casings so the scan can test membership
+# without lowercasing every filename; mixed case falls back to lower()
+_IMAGE_EXTENSIONS = frozenset(
+    variant
+    for extension in ('jpg', 'jpeg', 'png', 'bmp')
+    for variant in (extension, extension.upper())
+)
+
+
+def _init_student_worker(model: str) -> None:
+    """Build the per-process DatasetProcessor (ProcessPoolExecutor initializer)"""
+    global _student_worker
+    _student_worker = DatasetProcessor(RecognitionEngine(model))
+
+
+def _process_student(student_name: str, image_paths: List[str]) -> List[np.ndarray]:
+    """
+    Process one student's images inside a worker process
+
+    Module-level so ProcessPoolExecutor can pickle it; the dlib models
+    live in the worker and never cross the process boundary.
+    """
+    global _student_worker
+    if _student_worker is None:
+        _init_student_worker("hog")
+    return _student_worker.process_student_images(student_name, image_paths)
+
 
 class DatasetProcessor:
     """Process student photo datasets for face recognition training"""
@@ -23,7 +72,23 @@ class DatasetProcessor:
         self.recognition_engine = recognition_engine
         self.datasets_path = Path("datasets")
         self.students_path = self.datasets_path / "students"
+        # Embeddings cached by image content hash, so re-running training
+        # only pays the encoder cost for new or changed files
+        self.embedding_cache_path = self.datasets_path / ".embedding_cache"
         self.supported_formats = {'.jpg', '.jpeg', '.png', '.bmp'}
+
+        # validate_dataset_structure memoized on the tree's mtimes, so
+        # status polls during training don't re-walk and re-decode
+        self._validation_key: Optional[Tuple[int, ...]] = None
+        self._validation_cache: Optional[Dict[str, any]] = None
+
+        # TurboJPEG() probes for the native library at construction time
+        self._turbojpeg = None
+        if TurboJPEG is not None:
+            try:
+                self._turbojpeg = TurboJPEG()
+            except (OSError, RuntimeError) as e:
+                logger.debug(f"TurboJPEG unavailable, using cv2 decode: {e}")
         
     def scan_student_folders(self) -> Dict[str, List[str]]:
         """
@@ -39,24 +104,30 @@ class DatasetProcessor:
                 logger.warning(f"Students directory not found: {self.students_path}")
                 return student_data
             
-            # Iterate through student folders
-            for student_folder in self.students_path.iterdir():
-                if not student_folder.is_dir():
-                    continue
-                
-                student_name = student_folder.name
-                image_paths = []
-                
-                # Find all image files in student folder
-                for image_file in student_folder.iterdir():
-                    if image_file.suffix.lower() in self.supported_formats:
-                        image_paths.append(str(image_file))
-                
-                if image_paths:
-                    student_data[student_name] = image_paths
-                    logger.info(f"Found {len(image_paths)} images for student: {student_name}")
-                else:
-                    logger.warning(f"No valid images found for student: {student_name}")
+            # os.scandir hands back DirEntry objects with cached type
+            # info, avoiding a stat plus Path allocation per entry
+            with os.scandir(self.students_path) as student_entries:
+                for student_entry in student_entries:
+                    if not student_entry.is_dir(follow_symlinks=False):
+                        continue
+
+                    student_name = student_entry.name
+                    image_paths = []
+
+                    # Find all image files in student folder
+                    with os.scandir(student_entry.path) as file_entries:
+                        for file_entry in file_entries:
+                            if not file_entry.is_file():
+                                continue
+                            extension = file_entry.name.rpartition('.')[2]
+                            if extension in _IMAGE_EXTENSIONS or extension.lower() in _IMAGE_EXTENSIONS:
+                                image_paths.append(file_entry.path)
+
+                    if image_paths:
+                        student_data[student_name] = image_paths
+                        logger.info(f"Found {len(image_paths)} images for student: {student_name}")
+                    else:
+                        logger.warning(f"No valid images found for student: {student_name}")
             
             logger.info(f"Scanned {len(student_data)} student folders with images")
             return student_data
@@ -76,80 +147,159 @@ class DatasetProcessor:
             Preprocessed image array or None if loading fails
         """
         try:
-            # Load image using OpenCV
-            image = cv2.imread(image_path)
-            if image is None:
-                logger.warning(f"Could not load image: {image_path}")
-                return None
-            
-            # Convert BGR to RGB
-            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            
-            # Resize if image is too large (for performance)
-            height, width = image_rgb.shape[:2]
-            max_dimension = 1024
-            
-            if max(height, width) > max_dimension:
-                scale = max_dimension / max(height, width)
-                new_width = int(width * scale)
-                new_height = int(height * scale)
-                image_rgb = cv2.resize(image_rgb, (new_width, new_height), interpolation=cv2.INTER_AREA)
-            
+            image_rgb = None
+
+            # Decode JPEGs straight to RGB via libjpeg-turbo when it is
+            # available, skipping the separate BGR->RGB pass entirely
+            if self._turbojpeg is not None and Path(image_path).suffix.lower() in ('.jpg', '.jpeg'):
+                try:
+                    with open(image_path, 'rb') as f:
+                        image_rgb = self._turbojpeg.decode(f.read(), pixel_format=TJPF_RGB)
+                    image_rgb = self._cap_resolution(image_rgb)
+                except Exception as e:
+                    image_rgb = None
+                    logger.warning(f"TurboJPEG decode failed for {image_path}, falling back to cv2: {e}")
+
+            if image_rgb is None:
+                # Decode from an mmap-backed view of the file: the
+                # kernel page cache serves repeated reads (validation
+                # then training touch the same files) and no extra
+                # userspace copy of the compressed bytes is made
+                decode_flag = self._decode_flag_for(image_path)
+
+                image = None
+                try:
+                    with open(image_path, 'rb') as f:
+                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                        try:
+                            # The frombuffer view must not outlive the
+                            # map; imdecode copies into a fresh array
+                            image = cv2.imdecode(
+                                np.frombuffer(mm, dtype=np.uint8),
+                                decode_flag
+                            )
+                        finally:
+                            mm.close()
+                except (OSError, ValueError) as e:
+                    logger.debug(f"mmap decode failed for {image_path}, using imread: {e}")
+                    image = cv2.imread(image_path, decode_flag)
+
+                if image is None:
+                    logger.warning(f"Could not load image: {image_path}")
+                    return None
+
+                # Downscale first, then convert: cvtColor cost scales
+                # with pixel count, so converting after the resize only
+                # touches the smaller image
+                image = self._cap_resolution(image)
+                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
             return image_rgb
-            
+
         except Exception as e:
             logger.error(f"Error loading image {image_path}: {e}")
             return None
+
+    @staticmethod
+    def _decode_flag_for(image_path: str) -> int:
+        """
+        Pick a decode flag from a header-only size peek
+
+        libjpeg can decode at 1/2 or 1/4 resolution for roughly the cost
+        of the smaller image, which beats a full decode followed by
+        resize for phone photos. PIL's lazy open reads just the header.
+        The reduced result still goes through _cap_resolution, so the
+        output resolution is unchanged.
+        """
+        try:
+            with Image.open(image_path) as peek:
+                largest = max(peek.size)
+        except Exception:
+            return cv2.IMREAD_COLOR
+
+        if largest > 4096:
+            return cv2.IMREAD_REDUCED_COLOR_4
+        if largest > 2048:
+            return cv2.IMREAD_REDUCED_COLOR_2
+        return cv2.IMREAD_COLOR
+
+    @staticmethod
+    def _cap_resolution(image: np.ndarray, max_dimension: int = 1024) -> np.ndarray:
+        """Downscale an image so its longest side is at most max_dimension"""
+        height, width = image.shape[:2]
+
+        if max(height, width) <= max_dimension:
+            return image
+
+        scale = max_dimension / max(height, width)
+        new_width = int(width * scale)
+        new_height = int(height * scale)
+        return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
     
-    def extract_face_from_image(self, image: np.ndarray, image_path: str) -> List[Tuple[np.ndarray, float]]:
+    def extract_face_from_image(self, image: np.ndarray, image_path: str) -> List[Tuple[Tuple[int, int, int, int], float]]:
         """
-        Extract face regions from an image with quality scores
-        
+        Detect faces in an image and score their quality
+
         Args:
-            image: Input image array
+            image: Input RGB image array
             image_path: Path to the image (for logging)
-            
+
         Returns:
-            List of tuples containing (face_image, quality_score)
+            List of tuples containing ((top, right, bottom, left), quality_score).
+            Locations feed straight into extract_embeddings_batch, so the
+            encoder runs once on the full image instead of per crop.
         """
         faces_with_quality = []
-        
+
         try:
-            # Convert RGB to BGR for OpenCV processing
-            bgr_image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            
-            # Detect faces
-            bounding_boxes = self.recognition_engine.detect_faces(bgr_image)
-            
+            # The image is already RGB: detect on it directly instead of
+            # converting the whole frame to BGR and back
+            bounding_boxes = self.recognition_engine.detect_faces_rgb(image)
+
             if not bounding_boxes:
                 logger.warning(f"No faces detected in image: {image_path}")
                 return faces_with_quality
-            
+
             for bbox in bounding_boxes:
-                # Extract face region
-                face_region = bgr_image[
+                # Extract face region for the quality check only
+                face_region = image[
                     bbox.y:bbox.y + bbox.height,
                     bbox.x:bbox.x + bbox.width
                 ]
-                
+
                 if face_region.size == 0:
                     continue
-                
-                # Validate face quality
-                is_valid, quality_score = self.recognition_engine.validate_face_quality(face_region)
-                
+
+                # Validate face quality directly on the RGB crop
+                is_valid, quality_score = self.recognition_engine.validate_face_quality_rgb(face_region)
+
                 if is_valid:
-                    faces_with_quality.append((face_region, quality_score))
-                    logger.debug(f"Extracted face with quality {quality_score:.3f} from {image_path}")
+                    location = (bbox.y, bbox.x + bbox.width, bbox.y + bbox.height, bbox.x)
+                    faces_with_quality.append((location, quality_score))
+                    logger.debug(f"Located face with quality {quality_score:.3f} in {image_path}")
                 else:
                     logger.warning(f"Low quality face (score: {quality_score:.3f}) in {image_path}")
-            
+
             return faces_with_quality
-            
+
         except Exception as e:
             logger.error(f"Error extracting faces from {image_path}: {e}")
             return []
     
+    def _embedding_cache_file(self, image_path: str) -> Optional[Path]:
+        """
+        Cache file for an image's embeddings, keyed by content + model
+
+        Hashing the bytes means edits invalidate the entry automatically,
+        and renames or re-uploads of identical files still hit.
+        """
+        try:
+            with open(image_path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+        return self.embedding_cache_path / f"{digest}_{self.recognition_engine.model}.npy"
+
     def process_student_images(self, student_name: str, image_paths: List[str]) -> List[np.ndarray]:
         """
         Process all images for a student and extract face embeddings
@@ -163,71 +313,185 @@ class DatasetProcessor:
         """
         embeddings = []
         processed_faces = 0
-        
+
         logger.info(f"Processing {len(image_paths)} images for student: {student_name}")
-        
+
+        try:
+            self.embedding_cache_path.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Could not create embedding cache directory: {e}")
+
+        # Serve unchanged images straight from the embedding cache; only
+        # new or modified files go through decode + detect + encode
+        uncached = []
         for image_path in image_paths:
-            # Load and preprocess image
-            image = self.load_and_preprocess_image(image_path)
-            if image is None:
-                continue
-            
-            # Extract faces from image
-            faces_with_quality = self.extract_face_from_image(image, image_path)
-            
-            for face_region, quality_score in faces_with_quality:
-                # Extract embedding
-                embedding = self.recognition_engine.extract_embedding(face_region)
-                
-                if embedding is not None:
-                    embeddings.append(embedding)
-                    processed_faces += 1
-                    logger.debug(f"Generated embedding for {student_name} from {os.path.basename(image_path)}")
+            cache_file = self._embedding_cache_file(image_path)
+
+            if cache_file is not None and cache_file.exists():
+                try:
+                    cached = np.load(cache_file)
+                    embeddings.extend(cached)
+                    processed_faces += len(cached)
+                    logger.debug(f"Embedding cache hit for {os.path.basename(image_path)}")
+                    continue
+                except Exception as e:
+                    logger.warning(f"Discarding unreadable cache entry for {image_path}: {e}")
+
+            uncached.append((image_path, cache_file))
+
+        # Read and decode the next few images on worker threads while
+        # this thread runs detection and encoding, hiding disk and JPEG
+        # decode latency behind the compute; cv2 releases the GIL
+        with ThreadPoolExecutor(max_workers=2) as prefetcher:
+            pending = deque()
+            next_index = 0
+
+            while next_index < len(uncached) and len(pending) < _PREFETCH_DEPTH:
+                path, cache_file = uncached[next_index]
+                pending.append((path, cache_file, prefetcher.submit(self.load_and_preprocess_image, path)))
+                next_index += 1
+
+            while pending:
+                image_path, cache_file, future = pending.popleft()
+
+                if next_index < len(uncached):
+                    path, next_cache_file = uncached[next_index]
+                    pending.append((path, next_cache_file, prefetcher.submit(self.load_and_preprocess_image, path)))
+                    next_index += 1
+
+                image = future.result()
+                if image is None:
+                    continue
+
+                # Locate faces, then encode all of them in one batched call
+                faces_with_quality = self.extract_face_from_image(image, image_path)
+                locations = [location for location, _ in faces_with_quality]
+                batch_embeddings = (
+                    self.recognition_engine.extract_embeddings_batch(image, locations)
+                    if locations else []
+                )
+
+                # Cache the outcome even when no usable face was found,
+                # so rescans skip those images as well
+                if cache_file is not None:
+                    try:
+                        np.save(
+                            cache_file,
+                            np.stack(batch_embeddings) if batch_embeddings
+                            else np.empty((0, 128), dtype=np.float64)
+                        )
+                    except OSError as e:
+                        logger.warning(f"Could not write embedding cache for {image_path}: {e}")
+
+                if batch_embeddings:
+                    embeddings.extend(batch_embeddings)
+                    processed_faces += len(batch_embeddings)
+                    logger.debug(f"Generated {len(batch_embeddings)} embeddings for {student_name} from {os.path.basename(image_path)}")
         
         logger.info(f"Generated {len(embeddings)} embeddings from {processed_faces} faces for {student_name}")
         return embeddings
     
-    def process_all_students(self) -> Dict[str, List[np.ndarray]]:
+    def iter_student_embeddings(self) -> Iterator[Tuple[str, List[np.ndarray]]]:
         """
-        Process all student folders and generate embeddings
-        
-        Returns:
-            Dictionary mapping student names to their face embeddings
+        Yield (student_name, embeddings) as each worker process finishes
+
+        Streaming one student at a time means the consumer never holds
+        the whole corpus in memory and can start storing the first
+        student while the pool is still processing the rest.
         """
-        all_embeddings = {}
-        
         # Scan for student folders
         student_data = self.scan_student_folders()
-        
+
         if not student_data:
             logger.warning("No student data found to process")
-            return all_embeddings
-        
-        # Process each student
-        for student_name, image_paths in student_data.items():
-            try:
-                embeddings = self.process_student_images(student_name, image_paths)
-                
+            return
+
+        # Enrollment is embarrassingly parallel across students: one
+        # worker process per CPU, each with its own recognition engine
+        with ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            initializer=_init_student_worker,
+            initargs=(self.recognition_engine.model,)
+        ) as pool:
+            futures = {
+                pool.submit(_process_student, student_name, image_paths): student_name
+                for student_name, image_paths in student_data.items()
+            }
+
+            for future in as_completed(futures):
+                student_name = futures[future]
+                try:
+                    embeddings = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing student {student_name}: {e}")
+                    continue
+
                 if embeddings:
-                    all_embeddings[student_name] = embeddings
                     logger.info(f"Successfully processed {len(embeddings)} embeddings for {student_name}")
+                    yield student_name, embeddings
                 else:
                     logger.warning(f"No valid embeddings generated for {student_name}")
-                    
-            except Exception as e:
-                logger.error(f"Error processing student {student_name}: {e}")
-                continue
-        
+
+    def process_all_students(self) -> Dict[str, List[np.ndarray]]:
+        """
+        Process all student folders and generate embeddings
+
+        Materializes the streaming iter_student_embeddings pipeline;
+        callers that can consume per student should iterate instead.
+
+        Returns:
+            Dictionary mapping student names to their face embeddings
+        """
+        all_embeddings = dict(self.iter_student_embeddings())
         logger.info(f"Dataset processing complete. Processed {len(all_embeddings)} students")
         return all_embeddings
     
+    def _validation_cache_key(self) -> Optional[Tuple[int, ...]]:
+        """
+        mtime fingerprint of the students tree, one level deep
+
+        The root mtime only changes when folders appear or disappear, so
+        each student folder's own mtime is included to catch added or
+        removed images. One shallow scandir of stats is orders of
+        magnitude cheaper than the validation walk it guards, which
+        decodes a sample image per student.
+        """
+        try:
+            mtimes = [os.stat(self.students_path).st_mtime_ns]
+            with os.scandir(self.students_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        mtimes.append(entry.stat().st_mtime_ns)
+        except OSError:
+            return None
+        return tuple(sorted(mtimes))
+
     def validate_dataset_structure(self) -> Dict[str, any]:
         """
         Validate the dataset directory structure and provide statistics
-        
+
+        The result is memoized against the dataset tree's mtimes: the
+        frontend polls training status on a timer, and re-validating an
+        unchanged tree on every poll re-issues identical syscalls and
+        sample decodes.
+
         Returns:
             Dictionary containing validation results and statistics
         """
+        key = self._validation_cache_key()
+        if key is not None and key == self._validation_key:
+            return self._validation_cache
+
+        validation_results = self._validate_dataset_structure_uncached()
+
+        if key is not None and validation_results["valid"]:
+            self._validation_key = key
+            self._validation_cache = validation_results
+
+        return validation_results
+
+    def _validate_dataset_structure_uncached(self) -> Dict[str, any]:
+        """Walk the dataset tree and build the validation report"""
         validation_results = {
             "valid": True,
             "errors": [],
@@ -273,8 +537,7 @@ class DatasetProcessor:
                 if image_paths:
                     first_image = self.load_and_preprocess_image(image_paths[0])
                     if first_image is not None:
-                        bgr_image = cv2.cvtColor(first_image, cv2.COLOR_RGB2BGR)
-                        faces = self.recognition_engine.detect_faces(bgr_image)
+                        faces = self.recognition_engine.detect_faces_rgb(first_image)
                         if not faces:
                             validation_results["warnings"].append(
                                 f"No faces detected in sample image for student {student_name}"
@@ -2,11 +2,16 @@
 Training service for processing datasets and training face recognition models
 """
 import asyncio
-from typing import Dict, List, Optional
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import structlog
+import cv2
 import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete
 
 from app.services.dataset_processor import DatasetProcessor
 from app.services.recognition_engine import RecognitionEngine
@@ -16,13 +21,101 @@ from app.core.database import AsyncSessionLocal
 
 logger = structlog.get_logger(__name__)
 
+# Below this many rows the COPY setup costs more than it saves and a
+# plain executemany INSERT wins
+_COPY_MIN_ROWS = 100
+
+# Streamed database writes commit once per this many students, bounding
+# both memory and the work lost to a failure mid-run
+_DB_BATCH_STUDENTS = 100
+
+# Per-process state for the enrollment worker: each ProcessPoolExecutor
+# worker loads the face detection models once and reuses them across jobs
+_worker_processor: Optional[DatasetProcessor] = None
+
+# cv2 releases the GIL during imdecode and cvtColor, so decoding the
+# enrollment images on threads scales with cores; threads are only
+# spawned on first use
+_decode_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+
+def _decode_enrollment_image(image_path: str) -> Optional[np.ndarray]:
+    """Decode one enrollment image to RGB, or None when it is unreadable"""
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def _extract_embeddings_worker(image_paths: List[str]) -> List[np.ndarray]:
+    """
+    Decode enrollment images and extract face embeddings
+
+    Module-level so it can run inside ProcessPoolExecutor workers; also
+    called directly when no executor is available.
+
+    Args:
+        image_paths: List of paths to image files on disk
+
+    Returns:
+        List of face embeddings extracted from the images
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = DatasetProcessor(RecognitionEngine())
+
+    embeddings = []
+
+    # Decode every image in parallel before the sequential face
+    # detection and encoding passes; an enrollment batch is small
+    # enough that holding all the decoded frames is cheap
+    rgb_images = list(_decode_pool.map(_decode_enrollment_image, image_paths))
+
+    for i, rgb_image in enumerate(rgb_images):
+        try:
+            if rgb_image is None:
+                logger.warning(f"Could not decode enrollment image {i}: {image_paths[i]}")
+                continue
+
+            faces_with_quality = _worker_processor.extract_face_from_image(
+                rgb_image,
+                f"upload_{i}"
+            )
+
+            if faces_with_quality:
+                locations = [location for location, _ in faces_with_quality]
+                embeddings.extend(
+                    _worker_processor.recognition_engine.extract_embeddings_batch(
+                        rgb_image, locations
+                    )
+                )
+
+        except Exception as e:
+            logger.error(f"Error processing enrollment image {i}: {e}")
+            continue
+
+    return embeddings
+
+
+async def _single_student(
+    student_name: str,
+    embeddings: List[np.ndarray]
+) -> AsyncIterator[Tuple[str, List[np.ndarray]]]:
+    """Adapt one student's embeddings to the streaming storage interface"""
+    yield student_name, embeddings
+
 
 class TrainingService:
     """Service for training face recognition models from datasets"""
     
-    def __init__(self):
-        """Initialize training service"""
-        self.recognition_engine = RecognitionEngine()
+    def __init__(self, recognition_engine: Optional[RecognitionEngine] = None):
+        """Initialize training service
+
+        Args:
+            recognition_engine: Shared engine to load trained embeddings
+                into; a private one is created when not provided
+        """
+        self.recognition_engine = recognition_engine or RecognitionEngine()
         self.dataset_processor = DatasetProcessor(self.recognition_engine)
         self.training_status = {
             "is_training": False,
@@ -60,8 +153,11 @@ class TrainingService:
             
             logger.info("Starting face recognition training from datasets")
             
-            # Validate dataset structure
-            validation_results = self.dataset_processor.validate_dataset_structure()
+            # Validate dataset structure (worker thread; it walks every
+            # folder and decodes a sample image per student)
+            validation_results = await asyncio.to_thread(
+                self.dataset_processor.validate_dataset_structure
+            )
             if not validation_results["valid"]:
                 self.training_status["is_training"] = False
                 return {
@@ -70,27 +166,29 @@ class TrainingService:
                     "validation_results": validation_results
                 }
             
-            # Process all student datasets
-            all_embeddings = self.dataset_processor.process_all_students()
-            
-            if not all_embeddings:
+            self.training_status["total_students"] = validation_results["statistics"]["total_students"]
+
+            # Stream students from the worker pool straight into the
+            # database: extraction of the next batch overlaps the
+            # write of the previous one, and peak memory stays at one
+            # batch of students' embeddings instead of the whole corpus
+            training_results = await self._store_embeddings_in_database(
+                self._iter_dataset_students()
+            )
+
+            if not training_results["embeddings_stored"]:
                 self.training_status["is_training"] = False
                 return {
                     "success": False,
                     "message": "No valid embeddings generated from datasets"
                 }
             
-            self.training_status["total_students"] = len(all_embeddings)
-            
-            # Store embeddings in database
-            training_results = await self._store_embeddings_in_database(all_embeddings)
-            
             # Update recognition engine with new embeddings
             await self._update_recognition_engine()
             
             self.training_status["is_training"] = False
             
-            logger.info(f"Training completed successfully for {len(all_embeddings)} students")
+            logger.info(f"Training completed successfully for {self.training_status['progress']} students")
             
             return {
                 "success": True,
@@ -111,13 +209,61 @@ class TrainingService:
                 "status": self.training_status
             }
     
-    async def _store_embeddings_in_database(self, all_embeddings: Dict[str, List[np.ndarray]]) -> Dict[str, any]:
+    async def _iter_dataset_students(self) -> AsyncIterator[Tuple[str, List[np.ndarray]]]:
+        """
+        Yield (student_name, embeddings) as worker processes finish
+
+        A worker thread drives the blocking ProcessPoolExecutor iteration
+        and feeds an asyncio.Queue, so the event loop stays free and the
+        database consumer runs concurrently with extraction. The queue is
+        bounded so a slow database never lets results pile up in memory.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+        done = object()
+        stopped = threading.Event()
+
+        def produce() -> None:
+            try:
+                for item in self.dataset_processor.iter_student_embeddings():
+                    if stopped.is_set():
+                        break
+                    asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            finally:
+                # A stopped consumer no longer drains the queue, so the
+                # sentinel could block forever and nobody reads it anyway
+                if not stopped.is_set():
+                    asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+        producer = loop.run_in_executor(None, produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            # If the consumer stopped early (e.g. a database write
+            # raised), the producer may be blocked on a full queue: stop
+            # further puts, then drain so the one in-flight put has room
+            # to resolve while we await the thread. The await also
+            # surfaces any exception the producer raised.
+            stopped.set()
+            while not queue.empty():
+                queue.get_nowait()
+            await producer
+
+    async def _store_embeddings_in_database(
+        self,
+        student_embeddings: AsyncIterator[Tuple[str, List[np.ndarray]]]
+    ) -> Dict[str, any]:
         """
         Store face embeddings in database
-        
+
         Args:
-            all_embeddings: Dictionary mapping student names to embeddings
-            
+            student_embeddings: Async iterator of (student_name,
+                embeddings) pairs, consumed as they become available
+
         Returns:
             Storage results and statistics
         """
@@ -127,106 +273,185 @@ class TrainingService:
             "embeddings_stored": 0,
             "errors": []
         }
-        
+
+        # Consume the stream in batches of _DB_BATCH_STUDENTS, stacking
+        # each student's embeddings into one compact float32 block as it
+        # arrives (float32 keeps plenty of precision for a 0.6 threshold
+        # at half the bytes). Each batch commits before the next is
+        # drained, so extraction overlaps the writes and peak memory
+        # stays at one batch rather than the whole corpus, while the
+        # per-batch queries stay consolidated
         async with AsyncSessionLocal() as session:
             try:
-                for student_name, embeddings in all_embeddings.items():
+                staged: List[Tuple[str, Optional[np.ndarray]]] = []
+                async for student_name, embeddings in student_embeddings:
                     self.training_status["current_student"] = student_name
-                    
-                    try:
-                        # Check if student already exists
-                        stmt = select(Student).where(Student.name == student_name)
-                        result = await session.execute(stmt)
-                        existing_student = result.scalar_one_or_none()
-                        
-                        if existing_student:
-                            # Update existing student
-                            student = existing_student
-                            student.is_active = True
-                            results["students_updated"] += 1
-                            
-                            # Remove old embeddings
-                            for old_embedding in student.face_embeddings:
-                                await session.delete(old_embedding)
-                            
-                        else:
-                            # Create new student
-                            # Extract additional info from folder name if available
-                            name_parts = student_name.replace('_', ' ').split()
-                            roll_number = None
-                            clean_name = student_name
-                            
-                            # Try to extract roll number from name
-                            if name_parts and name_parts[-1].isdigit():
-                                roll_number = name_parts[-1]
-                                clean_name = ' '.join(name_parts[:-1])
-                            
-                            student = Student(
-                                name=clean_name,
-                                student_number=roll_number,
-                                roll_number=roll_number,
-                                is_active=True
-                            )
-                            session.add(student)
-                            results["students_created"] += 1
-                        
-                        # Store embeddings
-                        for i, embedding in enumerate(embeddings):
-                            # Serialize embedding to bytes
-                            embedding_bytes = embedding.astype(np.float64).tobytes()
-                            
-                            face_embedding = FaceEmbedding(
-                                student_id=student.id,
-                                embedding=embedding_bytes,
-                                quality_score=0.8  # Default quality score
-                            )
-                            session.add(face_embedding)
-                            results["embeddings_stored"] += 1
-                        
+                    stacked = (
+                        np.ascontiguousarray(np.stack(embeddings), dtype=np.float32)
+                        if embeddings else None
+                    )
+                    staged.append((student_name, stacked))
+                    logger.info(f"Queued {len(embeddings)} embeddings for student: {student_name}")
+
+                    if len(staged) >= _DB_BATCH_STUDENTS:
+                        await self._store_student_batch(session, staged, results)
                         await session.commit()
-                        
-                        self.training_status["completed_students"].append(student_name)
-                        self.training_status["progress"] = len(self.training_status["completed_students"])
-                        
-                        logger.info(f"Stored {len(embeddings)} embeddings for student: {student_name}")
-                        
-                    except Exception as e:
-                        await session.rollback()
-                        error_msg = f"Error storing data for student {student_name}: {str(e)}"
-                        results["errors"].append(error_msg)
-                        self.training_status["errors"].append(error_msg)
-                        logger.error(error_msg)
-                        continue
-                
+                        staged = []
+
+                if staged:
+                    await self._store_student_batch(session, staged, results)
+                    await session.commit()
+
                 logger.info(f"Database storage complete: {results}")
                 return results
-                
+
             except Exception as e:
                 await session.rollback()
                 error_msg = f"Database storage failed: {str(e)}"
                 results["errors"].append(error_msg)
+                self.training_status["errors"].append(error_msg)
                 logger.error(error_msg)
                 raise
+
+    async def _store_student_batch(
+        self,
+        session: AsyncSession,
+        staged: List[Tuple[str, Optional[np.ndarray]]],
+        results: Dict[str, any]
+    ) -> None:
+        """Write one batch of students and their embeddings"""
+        # Resolve every student in the batch with one SELECT instead
+        # of a round trip per name
+        names = [name for name, _ in staged]
+        stmt = select(Student).where(Student.name.in_(names))
+        result = await session.execute(stmt)
+        existing_by_name = {s.name: s for s in result.scalars()}
+
+        resolved: List[Tuple[Student, Optional[np.ndarray]]] = []
+        updated_students: List[Student] = []
+        new_students: List[Student] = []
+
+        for student_name, stacked in staged:
+            student = existing_by_name.get(student_name)
+
+            if student is not None:
+                # Update existing student
+                student.is_active = True
+                updated_students.append(student)
+                results["students_updated"] += 1
+
+            else:
+                # Create new student
+                # Extract additional info from folder name if available
+                name_parts = student_name.replace('_', ' ').split()
+                roll_number = None
+                clean_name = student_name
+
+                # Try to extract roll number from name
+                if name_parts and name_parts[-1].isdigit():
+                    roll_number = name_parts[-1]
+                    clean_name = ' '.join(name_parts[:-1])
+
+                student = Student(
+                    name=clean_name,
+                    student_number=roll_number,
+                    roll_number=roll_number,
+                    is_active=True
+                )
+                new_students.append(student)
+                results["students_created"] += 1
+
+            resolved.append((student, stacked))
+            self.training_status["completed_students"].append(student_name)
+            self.training_status["progress"] = len(self.training_status["completed_students"])
+
+        # One bulk DELETE clears every updated student's old
+        # embeddings instead of removing ORM objects row by row
+        if updated_students:
+            await session.execute(
+                delete(FaceEmbedding).where(
+                    FaceEmbedding.student_id.in_(
+                        [s.id for s in updated_students]
+                    )
+                )
+            )
+
+        # One flush populates every new student's id via
+        # RETURNING, without the round trips of per-row commits
+        session.add_all(new_students)
+        await session.flush()
+
+        # Each row is a zero-copy slice of its student's block
+        # instead of its own astype + tobytes pair
+        embedding_rows: List[Dict] = []
+        for student, stacked in resolved:
+            if stacked is None:
+                continue
+
+            flat = memoryview(stacked).cast("B")
+            row_size = stacked.shape[1] * stacked.itemsize
+
+            for i in range(stacked.shape[0]):
+                embedding_rows.append({
+                    # Ids are generated here because COPY bypasses the
+                    # model's client-side column default
+                    "id": str(uuid.uuid4()),
+                    "student_id": student.id,
+                    "embedding": flat[i * row_size:(i + 1) * row_size],
+                    "quality_score": 0.8  # Default quality score
+                })
+
+        await self._bulk_insert_embeddings(session, embedding_rows)
+        results["embeddings_stored"] += len(embedding_rows)
+
+    @staticmethod
+    async def _bulk_insert_embeddings(session: AsyncSession, embedding_rows: List[Dict]) -> None:
+        """
+        Write embedding rows in bulk within the session's transaction
+
+        On PostgreSQL with enough rows this goes through asyncpg's binary
+        COPY, which skips per-row INSERT protocol overhead; everywhere
+        else (SQLite, small batches) a single executemany is used.
+        """
+        if not embedding_rows:
+            return
+
+        connection = await session.connection()
+
+        if (
+            connection.dialect.name == "postgresql"
+            and len(embedding_rows) > _COPY_MIN_ROWS
+        ):
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                FaceEmbedding.__table__.name,
+                records=[
+                    (row["id"], row["student_id"], row["embedding"], row["quality_score"])
+                    for row in embedding_rows
+                ],
+                columns=["id", "student_id", "embedding", "quality_score"],
+            )
+        else:
+            await session.execute(insert(FaceEmbedding), embedding_rows)
     
     async def _update_recognition_engine(self) -> None:
         """Update recognition engine with latest embeddings from database"""
         try:
             async with AsyncSessionLocal() as session:
-                # Load all active students with their embeddings
-                stmt = select(Student).where(Student.is_active == True)
+                # One joined query for every active student's embedding
+                # rows, instead of loading Student objects and touching
+                # each face_embeddings collection separately
+                stmt = (
+                    select(FaceEmbedding.student_id, FaceEmbedding.embedding)
+                    .join(Student, FaceEmbedding.student_id == Student.id)
+                    .where(Student.is_active == True)
+                )
                 result = await session.execute(stmt)
-                students = result.scalars().all()
-                
-                student_embeddings = {}
-                
-                for student in students:
-                    embeddings_bytes = []
-                    for face_embedding in student.face_embeddings:
-                        embeddings_bytes.append(face_embedding.embedding)
-                    
-                    if embeddings_bytes:
-                        student_embeddings[student.id] = embeddings_bytes
-                
+
+                student_embeddings: Dict[str, List[bytes]] = {}
+                for student_id, embedding_bytes in result:
+                    student_embeddings.setdefault(student_id, []).append(embedding_bytes)
+
                 # Load embeddings into recognition engine
                 self.recognition_engine.load_known_faces(student_embeddings)
                 
@@ -238,53 +463,48 @@ class TrainingService:
     
     async def get_training_status(self) -> Dict[str, any]:
         """Get current training status"""
+        # The validation walks the dataset directory; keep it off the
+        # event loop
+        dataset_info = await asyncio.to_thread(
+            self.dataset_processor.validate_dataset_structure
+        )
         return {
             "status": self.training_status,
-            "dataset_info": self.dataset_processor.validate_dataset_structure()
+            "dataset_info": dataset_info
         }
     
-    async def enroll_single_student(self, student_name: str, image_files: List[bytes]) -> Dict[str, any]:
+    async def enroll_single_student(
+        self,
+        student_name: str,
+        image_paths: List[str],
+        executor=None
+    ) -> Dict[str, any]:
         """
         Enroll a single student with provided image files
-        
+
         Args:
             student_name: Name of the student
-            image_files: List of image file bytes
-            
+            image_paths: List of paths to uploaded image files on disk
+            executor: Optional ProcessPoolExecutor for the CPU-bound
+                decode + embedding extraction; when given, the event loop
+                stays free while a worker process does the heavy lifting
+
         Returns:
             Enrollment results
         """
         try:
             logger.info(f"Enrolling single student: {student_name}")
-            
-            # Process images and extract embeddings
-            embeddings = []
-            
-            for i, image_bytes in enumerate(image_files):
-                try:
-                    # Convert bytes to numpy array
-                    nparr = np.frombuffer(image_bytes, np.uint8)
-                    image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    
-                    if image is None:
-                        logger.warning(f"Could not decode image {i} for student {student_name}")
-                        continue
-                    
-                    # Extract faces and embeddings
-                    faces_with_quality = self.dataset_processor.extract_face_from_image(
-                        cv2.cvtColor(image, cv2.COLOR_BGR2RGB), 
-                        f"upload_{i}"
-                    )
-                    
-                    for face_region, quality_score in faces_with_quality:
-                        embedding = self.recognition_engine.extract_embedding(face_region)
-                        if embedding is not None:
-                            embeddings.append(embedding)
-                    
-                except Exception as e:
-                    logger.error(f"Error processing image {i} for student {student_name}: {e}")
-                    continue
-            
+
+            # Extract embeddings off the event loop when a pool is
+            # available; the DB storage below stays in this process
+            if executor is not None:
+                loop = asyncio.get_running_loop()
+                embeddings = await loop.run_in_executor(
+                    executor, _extract_embeddings_worker, image_paths
+                )
+            else:
+                embeddings = _extract_embeddings_worker(image_paths)
+
             if not embeddings:
                 return {
                     "success": False,
@@ -292,8 +512,9 @@ class TrainingService:
                 }
             
             # Store in database
-            embedding_dict = {student_name: embeddings}
-            results = await self._store_embeddings_in_database(embedding_dict)
+            results = await self._store_embeddings_in_database(
+                _single_student(student_name, embeddings)
+            )
             
             # Update recognition engine
             await self._update_recognition_engine()
@@ -315,8 +536,8 @@ class TrainingService:
     async def get_dataset_statistics(self) -> Dict[str, any]:
         """Get comprehensive dataset statistics"""
         try:
-            # Scan filesystem
-            student_data = self.dataset_processor.scan_student_folders()
+            # Scan filesystem (worker thread; it walks every folder)
+            student_data = await asyncio.to_thread(self.dataset_processor.scan_student_folders)
             
             # Get database statistics
             async with AsyncSessionLocal() as session:
@@ -339,7 +560,7 @@ class TrainingService:
             }
             
             # Validation results
-            validation = self.dataset_processor.validate_dataset_structure()
+            validation = await asyncio.to_thread(self.dataset_processor.validate_dataset_structure)
             
             return {
                 "filesystem": fs_stats,
@@ -3,7 +3,7 @@
 Quick deployment script for face recognition system
 """
 
-import os
+import shutil
 import sys
 import subprocess
 import logging
@@ -35,9 +35,14 @@ def main():
         logger.error("Please run this script from the backend directory")
         sys.exit(1)
     
-    # Install dependencies
+    # Install dependencies; uv resolves orders of magnitude faster than
+    # pip when it is installed, so prefer it
     logger.info("📦 Installing dependencies...")
-    if not run_command("pip install -r requirements.txt"):
+    if shutil.which("uv"):
+        installed = run_command("uv pip install -r requirements.txt")
+    else:
+        installed = run_command("pip install -r requirements.txt")
+    if not installed:
         logger.error("Failed to install dependencies")
         sys.exit(1)
     
@@ -52,8 +57,10 @@ def main():
     logger.info("Server will be available at: http://localhost:8000")
     logger.info("API documentation at: http://localhost:8000/docs")
     
-    # Run the server
-    os.system("python -m uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload")
+    # Run the server in this interpreter instead of forking a fresh
+    # python via the shell, skipping a second interpreter cold start
+    import uvicorn
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
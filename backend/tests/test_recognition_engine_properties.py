@@ -125,18 +125,32 @@ class TestRecognitionEngineProperties:
             recognition_engine.load_known_faces(known_faces)
             recognition_engine.recognition_threshold = threshold
             
-            # Test with remaining embeddings
-            for test_embedding in embeddings[1:]:
-                similarity = recognition_engine.compare_embeddings(embeddings[0], test_embedding)
-                
-                # Simulate recognition decision
-                should_recognize = similarity > threshold
-                
+            # Test with remaining embeddings, scored in one vectorized pass
+            # using the engine's distance-based confidence scale
+            if len(embeddings) > 1:
+                probe = embeddings[0]
+                matrix = np.stack(embeddings[1:])
+                sq_distances = np.maximum(
+                    probe @ probe
+                    + np.einsum("ij,ij->i", matrix, matrix)
+                    - 2.0 * (matrix @ probe),
+                    0.0,
+                )
+                similarities = np.maximum(0.0, 1.0 - np.sqrt(sq_distances) / 0.6)
+
+                # Vectorized scores must agree with the engine's scalar path
+                scalar_similarity = recognition_engine.compare_embeddings(probe, embeddings[1])
+                assert abs(similarities[0] - scalar_similarity) < 1e-6, \
+                    f"Vectorized similarity {similarities[0]} diverges from scalar {scalar_similarity}"
+
+                # Simulate recognition decisions
+                should_recognize = similarities > threshold
+
                 # Verify threshold enforcement
-                if should_recognize:
-                    assert similarity > threshold, f"Recognition should occur when similarity {similarity} > threshold {threshold}"
-                else:
-                    assert similarity <= threshold, f"Recognition should not occur when similarity {similarity} <= threshold {threshold}"
+                assert np.all(similarities[should_recognize] > threshold), \
+                    f"Recognition should occur only when similarity > threshold {threshold}"
+                assert np.all(similarities[~should_recognize] <= threshold), \
+                    f"Recognition should not occur when similarity <= threshold {threshold}"
     
     @given(
         bounding_boxes=st.lists(